@@ -65,7 +65,20 @@ LLM_MAX_TOKENS: int    = int(os.environ.get("LLM_MAX_TOKENS",    _get("llm.max_t
 # Embeddings
 # ---------------------------------------------------------------------------
 
-EMBEDDING_MODEL: str = os.environ.get("EMBEDDING_MODEL", _get("embeddings.model", "text-embedding-3-small"))
+EMBEDDING_MODEL: str      = os.environ.get("EMBEDDING_MODEL", _get("embeddings.model", "text-embedding-3-small"))
+# Nº de chunks enviados por llamada a la API de embeddings (batching).
+# 1000 (el default de la librería) es también el techo seguro con nuestros
+# chunks de ~1000 caracteres: la API limita cada petición a 300k tokens en
+# total y la librería agrupa solo por nº de inputs, sin presupuesto de
+# tokens — con 2048 inputs una petición lo rebasa y devuelve un 400.
+# No bajar de 1000 tampoco: multiplica los round-trips.
+EMBEDDING_BATCH_SIZE: int = int(os.environ.get("EMBEDDING_BATCH_SIZE", _get("embeddings.batch_size", 1000)))
+
+# Directorio de caché persistente de embeddings (vacío = desactivada).
+# Clave = hash(chunk) dentro del namespace del modelo → re-indexar un documento
+# editado solo paga llamadas a la API por los chunks que cambiaron.
+# En Lambda apúntalo a /tmp/embedding_cache (sobrevive entre invocaciones warm).
+EMBEDDING_CACHE_DIR: str  = os.environ.get("EMBEDDING_CACHE_DIR", _get("embeddings.cache_dir", ""))
 
 # ---------------------------------------------------------------------------
 # Vectorstore
@@ -82,6 +95,10 @@ RDS_DB: str       = os.environ.get("DB_NAME",     _get("vectorstore.pgvector.dat
 RDS_USER: str     = os.environ.get("DB_USER",     _get("vectorstore.pgvector.user", "ragadmin"))
 RDS_PASSWORD: str = os.environ.get("DB_PASSWORD", _get("vectorstore.pgvector.password", ""))
 
+# Indexación con COPY FROM STDIN en lugar de inserts fila a fila del ORM.
+# Si el COPY falla por cualquier motivo se usa el camino estándar de langchain.
+PGVECTOR_BULK_INSERT: bool = bool(_get("vectorstore.pgvector.bulk_insert", True))
+
 # ---------------------------------------------------------------------------
 # Retrieval
 # ---------------------------------------------------------------------------
@@ -90,6 +107,8 @@ RETRIEVER_SEARCH_TYPE: str       = _get("retrieval.search_type", "mmr")
 RETRIEVER_K: int                 = int(_get("retrieval.k", 4))
 RETRIEVER_FETCH_K: int           = int(_get("retrieval.fetch_k", 12))
 RETRIEVER_SCORE_THRESHOLD: float = float(_get("retrieval.score_threshold", 0.7))
+# Tamaño de la caché LRU de resultados de consulta (0 = desactivada)
+QUERY_CACHE_SIZE: int            = int(_get("retrieval.query_cache_size", 128))
 
 # ---------------------------------------------------------------------------
 # Chunking
@@ -12,20 +12,18 @@ Estrategias de chunking disponibles (configurar en setup.yaml):
 """
 
 import os
+import json
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Tuple, Union
 
-from langchain_community.document_loaders import (
-    DirectoryLoader,
-    TextLoader,
-    PyPDFLoader,
-    UnstructuredMarkdownLoader,
-)
+# Solo importamos langchain_core a nivel de módulo (ligero, lo usan las
+# anotaciones). langchain_community y langchain_openai son los imports caros
+# del cold start y se cargan de forma perezosa en su primer uso.
 from langchain_core.documents import Document
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 
 import config as settings
 
@@ -33,23 +31,43 @@ import config as settings
 # =============================================================================
 # 1. CARGA DE DOCUMENTOS
 # =============================================================================
+# La extracción de texto se delega en los loaders de langchain, que ya emiten
+# un Document por página/sección: en ningún punto concatenamos el texto
+# completo con `+=` (el clásico coste O(N²) en PDFs grandes). Cualquier
+# ensamblado posterior de contexto usa "".join sobre listas.
+
+# Dispatch único extensión → loader, compartido por la carga de directorios
+# y la de ficheros sueltos. Añadir un formato nuevo = añadir una entrada aquí.
+
+@lru_cache(maxsize=None)
+def _ext_loaders() -> dict:
+    from langchain_community.document_loaders import (
+        TextLoader,
+        PyPDFium2Loader,
+        UnstructuredMarkdownLoader,
+    )
+
+    return {
+        ".txt": TextLoader,
+        ".md":  UnstructuredMarkdownLoader,
+        # PDFium (C++) extrae texto bastante más rápido que pypdf en Python puro
+        ".pdf": PyPDFium2Loader,
+    }
 
 def load_documents(directory: str) -> List[Document]:
     """
     Carga todos los documentos del directorio indicado.
     Las extensiones soportadas se configuran en setup.yaml → docs.supported_extensions.
     """
+    from langchain_community.document_loaders import DirectoryLoader
+
     docs = []
     path = Path(directory)
 
     if not path.exists():
         raise FileNotFoundError(f"Directorio no encontrado: {directory}")
 
-    loader_map = {
-        "**/*.txt": TextLoader,
-        "**/*.md":  UnstructuredMarkdownLoader,
-        "**/*.pdf": PyPDFLoader,
-    }
+    loader_map = {f"**/*{ext}": loader_cls for ext, loader_cls in _ext_loaders().items()}
 
     for glob_pattern in settings.DOCS_EXTENSIONS:
         loader_cls = loader_map.get(glob_pattern)
@@ -72,6 +90,23 @@ def load_documents(directory: str) -> List[Document]:
     return docs
 
 
+def load_single_document(path: str) -> List[Document]:
+    """
+    Carga un único fichero eligiendo el loader directamente por extensión.
+    Evita pasar por DirectoryLoader (un glob por cada patrón configurado)
+    cuando ya sabemos exactamente qué fichero queremos — es el caso de la
+    Lambda, que procesa los objetos de S3 de uno en uno.
+    """
+    ext = Path(path).suffix.lower()
+    loader_cls = _ext_loaders().get(ext)
+    if loader_cls is None:
+        raise ValueError(f"Extensión sin loader registrado: '{ext}' ({path})")
+
+    docs = loader_cls(path).load()
+    print(f"  [{ext}] → {len(docs)} documento(s) cargado(s) desde {path}")
+    return docs
+
+
 # =============================================================================
 # 2. CHUNKING — múltiples estrategias
 # =============================================================================
@@ -126,19 +161,38 @@ def split_documents(docs: List[Document]) -> Union[List[Document], Tuple[List[Do
 # 2a. Recursive Character Text Splitter
 # ---------------------------------------------------------------------------
 
+@lru_cache(maxsize=None)
+def _recursive_splitter(chunk_size: int, chunk_overlap: int, separators: tuple = None):
+    """
+    Factoría cacheada de RecursiveCharacterTextSplitter. Los splitters son
+    stateless y la configuración no cambia dentro de un proceso, así que una
+    Lambda warm que procesa muchos ficheros reutiliza la misma instancia en
+    lugar de reconstruirla (compila sus regex de separadores cada vez).
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    kwargs = {}
+    if separators is not None:
+        kwargs["separators"] = list(separators)
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        **kwargs,
+    )
+
+
 def _split_recursive(docs: List[Document], cfg: dict) -> List[Document]:
     """
     Split jerárquico clásico. Intenta dividir por párrafos, luego líneas,
     luego frases y por último caracteres individuales.
     Bueno para texto genérico sin estructura clara.
     """
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
-
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=cfg.get("chunk_size", 1000),
-        chunk_overlap=cfg.get("chunk_overlap", 150),
-        separators=cfg.get("separators", ["\n\n", "\n", ". ", " ", ""]),
-        length_function=len,
+    splitter = _recursive_splitter(
+        cfg.get("chunk_size", 1000),
+        cfg.get("chunk_overlap", 150),
+        tuple(cfg.get("separators", ["\n\n", "\n", ". ", " ", ""])),
     )
     chunks = splitter.split_documents(docs)
     print(f"  chunk_size={cfg.get('chunk_size')}  overlap={cfg.get('chunk_overlap')}")
@@ -157,10 +211,7 @@ def _split_markdown_header(docs: List[Document], cfg: dict) -> List[Document]:
 
     Mejor para: documentación técnica, wikis, READMEs.
     """
-    from langchain_text_splitters import (
-        MarkdownHeaderTextSplitter,
-        RecursiveCharacterTextSplitter,
-    )
+    from langchain_text_splitters import MarkdownHeaderTextSplitter
 
     raw_headers = cfg.get("headers_to_split_on", [["#", "h1"], ["##", "h2"], ["###", "h3"]])
     headers_to_split_on = [tuple(h) for h in raw_headers]
@@ -170,9 +221,9 @@ def _split_markdown_header(docs: List[Document], cfg: dict) -> List[Document]:
         strip_headers=cfg.get("strip_headers", False),
     )
 
-    size_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=cfg.get("chunk_size", 1000),
-        chunk_overlap=cfg.get("chunk_overlap", 100),
+    size_splitter = _recursive_splitter(
+        cfg.get("chunk_size", 1000),
+        cfg.get("chunk_overlap", 100),
     )
 
     all_chunks = []
@@ -287,16 +338,15 @@ def _split_parent_document(
     Mejor para: documentos largos donde necesitas precisión en la búsqueda
                 pero contexto amplio para generar la respuesta.
     """
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
     import uuid
 
-    parent_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=cfg.get("parent_chunk_size", 2000),
-        chunk_overlap=cfg.get("parent_chunk_overlap", 200),
+    parent_splitter = _recursive_splitter(
+        cfg.get("parent_chunk_size", 2000),
+        cfg.get("parent_chunk_overlap", 200),
     )
-    child_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=cfg.get("child_chunk_size", 400),
-        chunk_overlap=cfg.get("child_chunk_overlap", 50),
+    child_splitter = _recursive_splitter(
+        cfg.get("child_chunk_size", 400),
+        cfg.get("child_chunk_overlap", 50),
     )
 
     parent_chunks = parent_splitter.split_documents(docs)
@@ -336,12 +386,12 @@ def _split_proposition(docs: List[Document], cfg: dict) -> List[Document]:
     Coste: hace llamadas al LLM durante la indexación (una por chunk base).
     Mejor para: documentos densos en hechos, bases de conocimiento, FAQs.
     """
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from langchain_openai import ChatOpenAI
 
     # Primero hacemos un split base para no mandar documentos enteros al LLM
-    base_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=cfg.get("base_chunk_size", 1500),
-        chunk_overlap=cfg.get("base_chunk_overlap", 100),
+    base_splitter = _recursive_splitter(
+        cfg.get("base_chunk_size", 1500),
+        cfg.get("base_chunk_overlap", 100),
     )
     base_chunks = base_splitter.split_documents(docs)
 
@@ -368,30 +418,40 @@ Proposiciones:"""
 
     proposition_chain = proposition_prompt | llm | StrOutputParser()
 
-    all_propositions = []
     total = len(base_chunks)
 
-    for i, chunk in enumerate(base_chunks, 1):
-        print(f"  Generando proposiciones: chunk {i}/{total}", end="\r")
-        try:
-            raw = proposition_chain.invoke({"text": chunk.page_content})
-            propositions = [p.strip() for p in raw.strip().split("\n") if p.strip()]
-
-            for prop in propositions:
-                all_propositions.append(
-                    Document(
-                        page_content=prop,
-                        metadata={
-                            **chunk.metadata,
-                            "original_chunk": chunk.page_content[:200],
-                            "proposition": True,
-                        },
-                    )
-                )
-        except Exception as e:
+    # Las llamadas al LLM son I/O puro (latencia de red), así que las lanzamos
+    # en paralelo con concurrencia acotada en lugar de chunk a chunk.
+    max_concurrency = int(os.environ.get("LLM_MAX_CONCURRENCY", cfg.get("max_concurrency", 8)))
+    print(f"  Generando proposiciones: {total} chunks (max_concurrency={max_concurrency})")
+
+    raw_results = proposition_chain.batch(
+        [{"text": chunk.page_content} for chunk in base_chunks],
+        config={"max_concurrency": max_concurrency},
+        return_exceptions=True,
+    )
+
+    all_propositions = []
+    for i, (chunk, raw) in enumerate(zip(base_chunks, raw_results), 1):
+        if isinstance(raw, Exception):
             # Si falla un chunk, lo incluimos tal cual para no perder contenido
-            print(f"\n  ⚠️  Error en chunk {i}, usando chunk original: {e}")
+            print(f"  ⚠️  Error en chunk {i}, usando chunk original: {raw}")
             all_propositions.append(chunk)
+            continue
+
+        propositions = [p.strip() for p in raw.strip().split("\n") if p.strip()]
+
+        for prop in propositions:
+            all_propositions.append(
+                Document(
+                    page_content=prop,
+                    metadata={
+                        **chunk.metadata,
+                        "original_chunk": chunk.page_content[:200],
+                        "proposition": True,
+                    },
+                )
+            )
 
     print(f"\n  base_chunk_size={cfg.get('base_chunk_size')}  "
           f"model={cfg.get('proposition_model', settings.LLM_MODEL)}")
@@ -402,12 +462,49 @@ Proposiciones:"""
 # 3. EMBEDDINGS
 # =============================================================================
 
+# Instancia única de embeddings: cada OpenAIEmbeddings arrastra su propio
+# cliente HTTP, y dentro de una misma indexación get_embeddings() se llama
+# desde varios sitios — reutilizar la instancia reutiliza el pool de conexiones.
+_embeddings = None
+
+
 def get_embeddings():
-    return OpenAIEmbeddings(
+    global _embeddings
+    if _embeddings is not None:
+        return _embeddings
+
+    from langchain_openai import OpenAIEmbeddings
+
+    embeddings = OpenAIEmbeddings(
         model=settings.EMBEDDING_MODEL,
         openai_api_key=settings.OPENAI_API_KEY,
+        # Batching: agrupa hasta N chunks por llamada a la API en lugar de
+        # embeber de uno en uno → menos round-trips y menos tiempo de indexación.
+        chunk_size=settings.EMBEDDING_BATCH_SIZE,
     )
 
+    # Caché persistente opcional: clave = hash(chunk) bajo el namespace del
+    # modelo, así re-indexar un documento editado solo llama a la API para
+    # los chunks nuevos. Si la caché falla por lo que sea, degradamos a
+    # embeddings sin caché en lugar de romper la indexación.
+    if settings.EMBEDDING_CACHE_DIR:
+        try:
+            from langchain.embeddings import CacheBackedEmbeddings
+            from langchain.storage import LocalFileStore
+
+            store = LocalFileStore(settings.EMBEDDING_CACHE_DIR)
+            embeddings = CacheBackedEmbeddings.from_bytes_store(
+                embeddings,
+                store,
+                namespace=settings.EMBEDDING_MODEL,
+            )
+            print(f"[embeddings] Caché activada en: {settings.EMBEDDING_CACHE_DIR}")
+        except Exception as e:
+            print(f"  ⚠️  Caché de embeddings no disponible ({e}) — usando API directa")
+
+    _embeddings = embeddings
+    return _embeddings
+
 
 # =============================================================================
 # 4. VECTORSTORE — backends
@@ -439,6 +536,122 @@ def _get_chroma(from_documents: bool, chunks: List[Document] = None,
     return vs
 
 
+def _vector_literal(vector) -> str:
+    """
+    Formatea un embedding como literal pgvector '[x,y,…]'.
+    Con numpy convertimos a float32 de una pasada: la columna es float32 de
+    todos modos, el repr es más corto (menos bytes por el COPY) y el formateo
+    vectorizado es bastante más rápido que str() sobre floats de Python.
+    """
+    try:
+        import numpy as np
+        return "[" + ",".join(np.asarray(vector, dtype=np.float32).astype(str)) + "]"
+    except ImportError:
+        return "[" + ",".join(map(str, vector)) + "]"
+
+
+class _ReadableIterator:
+    """
+    Adaptador file-like de solo lectura sobre un iterador de strings.
+    Permite pasar un generador de filas a cursor.copy_expert sin tener que
+    materializar el CSV completo en memoria.
+    """
+
+    def __init__(self, iterable):
+        self._iter = iter(iterable)
+        self._buf = ""
+
+    def read(self, size: int = -1) -> str:
+        if size is None or size < 0:
+            out = self._buf + "".join(self._iter)
+            self._buf = ""
+            return out
+        while len(self._buf) < size:
+            try:
+                self._buf += next(self._iter)
+            except StopIteration:
+                break
+        out, self._buf = self._buf[:size], self._buf[size:]
+        return out
+
+
+def _iter_copy_rows(chunks: List[Document], collection_id: str):
+    """
+    Genera las filas CSV del COPY en streaming: embebe por lotes de
+    EMBEDDING_BATCH_SIZE y emite cada fila según se consume, de modo que el
+    pico de memoria es un lote de embeddings y no el documento entero.
+    """
+    import csv
+    import io
+    import uuid
+
+    embeddings = get_embeddings()
+    batch_size = settings.EMBEDDING_BATCH_SIZE
+
+    for start in range(0, len(chunks), batch_size):
+        batch   = chunks[start:start + batch_size]
+        vectors = embeddings.embed_documents([c.page_content for c in batch])
+
+        for chunk, vector in zip(batch, vectors):
+            row_id = str(uuid.uuid4())
+            buf = io.StringIO()
+            csv.writer(buf).writerow([
+                collection_id,
+                _vector_literal(vector),
+                chunk.page_content,
+                json.dumps(chunk.metadata, ensure_ascii=False),
+                row_id,
+                row_id,
+            ])
+            yield buf.getvalue()
+
+
+def _pgvector_bulk_insert(chunks: List[Document], collection_name: str):
+    """
+    Inserta los chunks en las tablas de langchain con COPY FROM STDIN.
+    PGVector.from_documents inserta fila a fila vía ORM; con cientos de
+    chunks el COPY reduce la indexación de N round-trips a uno solo.
+    Las filas se generan en streaming (ver _iter_copy_rows).
+    """
+    import uuid
+    import psycopg2
+
+    conn = psycopg2.connect(
+        host=settings.RDS_HOST,
+        port=settings.RDS_PORT,
+        dbname=settings.RDS_DB,
+        user=settings.RDS_USER,
+        password=settings.RDS_PASSWORD,
+    )
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                # Reutilizar (o crear) la fila de colección que espera langchain
+                cur.execute(
+                    "SELECT uuid FROM langchain_pg_collection WHERE name = %s",
+                    (collection_name,),
+                )
+                row = cur.fetchone()
+                if row:
+                    collection_id = str(row[0])
+                else:
+                    collection_id = str(uuid.uuid4())
+                    cur.execute(
+                        "INSERT INTO langchain_pg_collection (name, cmetadata, uuid) "
+                        "VALUES (%s, %s, %s)",
+                        (collection_name, json.dumps({}), collection_id),
+                    )
+
+                cur.copy_expert(
+                    "COPY langchain_pg_embedding "
+                    "(collection_id, embedding, document, cmetadata, custom_id, uuid) "
+                    "FROM STDIN WITH (FORMAT csv)",
+                    _ReadableIterator(_iter_copy_rows(chunks, collection_id)),
+                )
+    finally:
+        conn.close()
+
+
 def _get_pgvector(from_documents: bool, chunks: List[Document] = None,
                   collection_name: str = None):
     from langchain_community.vectorstores import PGVector
@@ -456,6 +669,19 @@ def _get_pgvector(from_documents: bool, chunks: List[Document] = None,
     )
 
     if from_documents:
+        if settings.PGVECTOR_BULK_INSERT:
+            try:
+                _pgvector_bulk_insert(chunks, col_name)
+                print(f"[pgvector] Bulk COPY de {len(chunks)} chunks → "
+                      f"{settings.RDS_HOST}/{settings.RDS_DB}")
+                return PGVector(
+                    collection_name=col_name,
+                    connection_string=connection_string,
+                    embedding_function=embeddings,
+                )
+            except Exception as e:
+                print(f"  ⚠️  Bulk COPY falló ({e}) — usando PGVector.from_documents")
+
         vs = PGVector.from_documents(
             documents=chunks,
             embedding=embeddings,
@@ -545,14 +771,77 @@ Pregunta: {question}
 """
 
 
+# Solapes de menos de este tamaño no se recortan: un match corto suele ser
+# coincidencia (un espacio, una palabra suelta) y no un chunk_overlap real.
+_MIN_OVERLAP_TRIM = 20
+
+
+def _trim_overlap(kept: str, text: str, max_overlap: int) -> str:
+    """
+    Recorta de `text` el solape parcial que comparte con un fragmento ya
+    aceptado: el prefijo que repite el final de `kept` (text es el chunk
+    siguiente en el documento) y el sufijo que repite su inicio (text es el
+    anterior). La búsqueda va del solape más largo al más corto y se acota a
+    max_overlap — más allá de la ventana de chunk_overlap no hay solape real.
+    """
+    limit = min(max_overlap, len(kept), len(text))
+    for size in range(limit, _MIN_OVERLAP_TRIM - 1, -1):
+        if kept.endswith(text[:size]):
+            text = text[size:].lstrip()
+            break
+
+    limit = min(max_overlap, len(kept), len(text))
+    for size in range(limit, _MIN_OVERLAP_TRIM - 1, -1):
+        if text.endswith(kept[:size]):
+            text = text[:-size].rstrip()
+            break
+
+    return text
+
+
+def _dedupe_contexts(texts: List[str]) -> List[str]:
+    """
+    Limpia los solapes del contexto antes de montar el prompt, preservando
+    el orden de relevancia:
+      - descarta fragmentos duplicados o contenidos en otro (p.ej. varios
+        hijos que resuelven al mismo chunk padre), y
+      - recorta el solape parcial entre fragmentos adyacentes del documento
+        (las colas repetidas del chunk_overlap, las frases compartidas entre
+        ventanas), que el LLM paga en tokens sin información nueva.
+    """
+    # La ventana de solape real la marca la config de chunking; dejamos
+    # margen por si los separadores desplazaron un poco el corte.
+    max_overlap = max(settings.CHUNK_OVERLAP * 2, 200)
+
+    unique: List[str] = []
+    for text in texts:
+        text = text.strip()
+        if not text or any(text in kept for kept in unique):
+            continue
+        # Si un fragmento ya aceptado está contenido en este, lo sustituimos
+        unique = [kept for kept in unique if kept not in text]
+        for kept in unique:
+            text = _trim_overlap(kept, text, max_overlap)
+        if text:
+            unique.append(text)
+    return unique
+
+
 def build_qa_chain(vectorstore) -> Tuple:
     """
     Monta la cadena RAG con LCEL.
+    Devuelve (chain, retriever, format_docs): el retrieval se ejecuta UNA vez
+    en query() y sus documentos alimentan tanto las fuentes como el contexto
+    del LLM — antes la cadena re-lanzaba el retriever internamente y cada
+    pregunta pagaba dos embeddings y dos búsquedas vectoriales.
+
     Cada estrategia de chunking puede tener su propia lógica de recuperación:
       - sentence_window → expande el contexto con la ventana almacenada en metadata
       - parent_document → sustituye el chunk hijo por su chunk padre antes de pasar al LLM
       - el resto        → comportamiento estándar
     """
+    from langchain_openai import ChatOpenAI
+
     strategy = settings.CHUNKING_STRATEGY
 
     base_retriever = vectorstore.as_retriever(
@@ -584,9 +873,9 @@ def build_qa_chain(vectorstore) -> Tuple:
     # -- Función de formateo de contexto según estrategia --
     if strategy == "sentence_window":
         def format_docs(docs: List[Document]) -> str:
-            return "\n\n".join(
-                doc.metadata.get("window_context", doc.page_content) for doc in docs
-            )
+            return "\n\n".join(_dedupe_contexts(
+                [doc.metadata.get("window_context", doc.page_content) for doc in docs]
+            ))
 
     elif strategy == "parent_document":
         # Cargamos la colección de padres para hacer el swap hijo → padre
@@ -603,43 +892,59 @@ def build_qa_chain(vectorstore) -> Tuple:
                 parent = parent_docs_map.get(parent_id)
                 # Si encontramos el padre usamos su contenido, si no el hijo
                 expanded.append(parent.page_content if parent else child.page_content)
-            return "\n\n".join(expanded)
+            # Varios hijos pueden apuntar al mismo padre → dedupe imprescindible
+            return "\n\n".join(_dedupe_contexts(expanded))
 
     else:
         def format_docs(docs: List[Document]) -> str:
-            return "\n\n".join(doc.page_content for doc in docs)
+            return "\n\n".join(_dedupe_contexts([doc.page_content for doc in docs]))
 
-    chain = (
-        {"context": base_retriever | format_docs, "question": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
-    )
+    chain = prompt | llm | StrOutputParser()
 
-    return chain, base_retriever
+    return chain, base_retriever, format_docs
 
 
 # =============================================================================
 # 6. CONSULTA
 # =============================================================================
 
-def query(chain_and_retriever: Tuple, question: str) -> dict:
-    """
-    Lanza una pregunta al sistema RAG y devuelve respuesta + fuentes.
-    """
-    chain, retriever = chain_and_retriever
+# Caché LRU en memoria de resultados completos de consulta (embedding de la
+# pregunta + retrieval + respuesta del LLM). Las preguntas repetidas son
+# habituales en sesiones de chat y cada acierto ahorra 2 llamadas de red.
+_query_cache: "OrderedDict[tuple, dict]" = OrderedDict()
 
-    source_docs = retriever.invoke(question)
-    answer      = chain.invoke(question)
 
+def _query_cache_get(cache_key: tuple):
+    if settings.QUERY_CACHE_SIZE <= 0:
+        return None
+    cached = _query_cache.get(cache_key)
+    if cached is not None:
+        _query_cache.move_to_end(cache_key)
+        print("[cache] Consulta repetida — respuesta servida desde caché")
+    return cached
+
+
+def _query_cache_put(cache_key: tuple, result: dict):
+    if settings.QUERY_CACHE_SIZE <= 0:
+        return
+    _query_cache[cache_key] = result
+    while len(_query_cache) > settings.QUERY_CACHE_SIZE:
+        _query_cache.popitem(last=False)   # expulsa la entrada menos reciente
+
+
+def _build_result(question: str, answer: str, source_docs: List[Document]) -> dict:
+    """Construye el dict de respuesta + fuentes a partir de los docs recuperados."""
     fragment_len = settings.LOG_MAX_FRAGMENT_LENGTH
     strategy     = settings.CHUNKING_STRATEGY
 
     sources = []
     for doc in source_docs:
+        fragment = doc.page_content[:fragment_len]
+        if len(doc.page_content) > fragment_len:
+            fragment += "..."
         entry = {
             "source":   doc.metadata.get("source", "desconocido"),
-            "fragment": doc.page_content[:fragment_len] + "...",
+            "fragment": fragment,
         }
         # Metadata extra según estrategia
         if strategy == "markdown_header":
@@ -658,3 +963,47 @@ def query(chain_and_retriever: Tuple, question: str) -> dict:
         "sources":           sources,
         "chunking_strategy": strategy,
     }
+
+
+def query(chain_and_retriever: Tuple, question: str) -> dict:
+    """
+    Lanza una pregunta al sistema RAG y devuelve respuesta + fuentes.
+    Los resultados se cachean en memoria (LRU) por pregunta exacta.
+    """
+    chain, retriever, format_docs = chain_and_retriever
+
+    cache_key = (settings.CHUNKING_STRATEGY, question.strip())
+    cached = _query_cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Un único retrieval: los mismos documentos sirven para las fuentes
+    # y para el contexto que recibe el LLM.
+    source_docs = retriever.invoke(question)
+    answer      = chain.invoke({"context": format_docs(source_docs), "question": question})
+
+    result = _build_result(question, answer, source_docs)
+    _query_cache_put(cache_key, result)
+    return result
+
+
+async def aquery(chain_and_retriever: Tuple, question: str) -> dict:
+    """
+    Variante asíncrona de query() — misma semántica y misma caché.
+    Útil para servir el RAG desde un contexto async (FastAPI, Lambda con
+    event loop) sin bloquear: retriever y LLM usan sus clientes async
+    nativos, así el event loop sigue libre durante la espera de red.
+    """
+    chain, retriever, format_docs = chain_and_retriever
+
+    cache_key = (settings.CHUNKING_STRATEGY, question.strip())
+    cached = _query_cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    source_docs = await retriever.ainvoke(question)
+    answer      = await chain.ainvoke({"context": format_docs(source_docs), "question": question})
+
+    result = _build_result(question, answer, source_docs)
+    _query_cache_put(cache_key, result)
+    return result
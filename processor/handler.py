@@ -8,7 +8,6 @@ import os
 import json
 import tempfile
 import urllib.parse
-import boto3
 
 # Las variables de entorno las inyecta deploy_rag.sh en la Lambda:
 #   DB_HOST, DB_NAME, DB_USER, DB_PASSWORD
@@ -17,11 +16,29 @@ import boto3
 #   COLLECTION_NAME   (opcional, default: rag_docs)
 
 
+# Extensiones con loader registrado en pipeline._ext_loaders().
+# (Constante propia: no importamos pipeline a nivel de módulo para no
+# arrastrar langchain al cold start cuando el evento se va a descartar.)
+_SUPPORTED_EXTENSIONS = frozenset({".txt", ".md", ".pdf"})
+
+# Cliente S3 compartido entre invocaciones warm: boto3 mantiene el pool de
+# conexiones HTTPS vivo, así que recrearlo por invocación desperdicia handshakes.
+_s3_client = None
+
+
+def _get_s3():
+    global _s3_client
+    if _s3_client is None:
+        import boto3
+        _s3_client = boto3.client("s3")
+    return _s3_client
+
+
 def handler(event, context):
     """Punto de entrada de la Lambda."""
     print(f"Evento recibido: {json.dumps(event)}")
 
-    s3 = boto3.client("s3")
+    s3 = _get_s3()
 
     # Puede venir un batch de registros S3
     for record in event.get("Records", []):
@@ -36,29 +53,153 @@ def handler(event, context):
             continue
 
         ext = os.path.splitext(key)[1].lower()
-        if ext not in (".txt", ".md", ".pdf"):
+        if ext not in _SUPPORTED_EXTENSIONS:
             print(f"Extensión no soportada: {ext} — ignorando {key}")
             continue
 
+        # Comprobar ANTES de descargar si el fichero ya está indexado con el
+        # mismo contenido. El ETag de S3 es el MD5 del objeto (salvo subidas
+        # multipart), así que un head_object nos ahorra descargar un fichero
+        # de cientos de MB solo para descubrir que no ha cambiado.
+        head = s3.head_object(Bucket=bucket, Key=key)
+        etag = head["ETag"].strip('"')
+        is_multipart = "-" in etag   # ETag multipart: no es un MD5 utilizable
+
+        if not is_multipart and _already_indexed(key, etag):
+            print(f"Sin cambios (hash {etag}) — saltando {key}")
+            continue
+
         # Descargar el archivo a /tmp (único directorio escribible en Lambda)
         with tempfile.TemporaryDirectory() as tmpdir:
             local_path = os.path.join(tmpdir, os.path.basename(key))
             print(f"Descargando a {local_path}...")
             s3.download_file(bucket, key, local_path)
 
+            # Para multipart no valía el ETag: hasheamos el fichero local
+            # y repetimos la comprobación antes de pagar el procesado.
+            file_hash = etag if not is_multipart else _hash_file(local_path)
+            if is_multipart and _already_indexed(key, file_hash):
+                print(f"Sin cambios (hash {file_hash}) — saltando {key}")
+                continue
+
             # Procesar con el pipeline
-            _process_document(local_path)
+            _process_document(local_path, key, file_hash)
+
+            # Retirar las versiones anteriores del fichero DESPUÉS de indexar
+            # la nueva: así la colección nunca se queda vacía a mitad y los
+            # chunks obsoletos no se acumulan re-subida tras re-subida.
+            _purge_stale_chunks(key, file_hash)
 
     return {"statusCode": 200, "body": "OK"}
 
 
-def _process_document(local_path: str):
+def _hash_file(path: str) -> str:
+    """
+    Huella del fichero en streaming, sin cargarlo en RAM.
+    Usamos BLAKE2b en lugar de MD5: solo es una huella de contenido (no hace
+    falta criptografía de subida) y es bastante más rápido en CPU de Lambda.
+    hashlib.file_digest (Python 3.11, el runtime de la imagen) hashea con un
+    buffer reutilizado vía readinto — cero copias intermedias por bloque.
+    """
+    import hashlib
+
+    with open(path, "rb") as f:
+        return hashlib.file_digest(
+            f, lambda: hashlib.blake2b(digest_size=16)
+        ).hexdigest()
+
+
+# Conexión a la BD compartida entre invocaciones: el contenedor de Lambda se
+# reutiliza mientras está warm, así que abrir/cerrar una conexión TCP+TLS por
+# invocación es latencia tirada a la basura.
+_db_conn = None
+
+
+def _get_db_conn():
+    """Devuelve la conexión psycopg2 cacheada, reconectando si está muerta."""
+    global _db_conn
+    import psycopg2
+
+    if _db_conn is not None and _db_conn.closed == 0:
+        try:
+            with _db_conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return _db_conn
+        except Exception:
+            # La conexión warm murió (timeout de RDS, failover…): reconectamos
+            _close_db_conn()
+
+    _db_conn = psycopg2.connect(
+        host=os.environ["DB_HOST"],
+        dbname=os.environ["DB_NAME"],
+        user=os.environ["DB_USER"],
+        password=os.environ["DB_PASSWORD"],
+        connect_timeout=5,
+    )
+    _db_conn.autocommit = True
+    return _db_conn
+
+
+def _close_db_conn():
+    """Cierra (si procede) y descarta la conexión cacheada."""
+    global _db_conn
+    if _db_conn is not None:
+        try:
+            _db_conn.close()
+        except Exception:
+            pass
+        _db_conn = None
+
+
+def _already_indexed(key: str, file_hash: str) -> bool:
+    """
+    Comprueba en pgvector si ya existen chunks de este fichero con este hash.
+    Ante cualquier error devuelve False: preferimos re-procesar de más a
+    bloquear la indexación por un fallo de conectividad con la BD.
+    """
+    try:
+        with _get_db_conn().cursor() as cur:
+            cur.execute(
+                "SELECT 1 FROM langchain_pg_embedding "
+                "WHERE cmetadata->>'s3_key' = %s AND cmetadata->>'file_hash' = %s "
+                "LIMIT 1",
+                (key, file_hash),
+            )
+            return cur.fetchone() is not None
+    except Exception as e:
+        print(f"⚠️  No se pudo comprobar el hash en la BD ({e}) — procesando igualmente")
+        _close_db_conn()
+        return False
+
+
+def _purge_stale_chunks(key: str, file_hash: str):
+    """
+    Elimina en un único DELETE los chunks de versiones anteriores del fichero
+    (mismo s3_key, hash distinto). IS DISTINCT FROM cubre también las filas
+    antiguas indexadas antes de que guardáramos file_hash en la metadata.
+    """
+    try:
+        with _get_db_conn().cursor() as cur:
+            cur.execute(
+                "DELETE FROM langchain_pg_embedding "
+                "WHERE cmetadata->>'s3_key' = %s "
+                "AND cmetadata->>'file_hash' IS DISTINCT FROM %s",
+                (key, file_hash),
+            )
+            if cur.rowcount:
+                print(f"🧹 Eliminados {cur.rowcount} chunks obsoletos de {key}")
+    except Exception as e:
+        print(f"⚠️  No se pudieron limpiar los chunks antiguos de {key}: {e}")
+        _close_db_conn()
+
+
+def _process_document(local_path: str, key: str, file_hash: str):
     """Carga, trocea e indexa un único documento."""
     # Importamos aquí para que el cold start no falle si hay algún problema de config
-    from pipeline import load_documents, split_documents, build_vectorstore
+    from pipeline import load_single_document, split_documents, build_vectorstore
 
     print(f"Cargando documento: {local_path}")
-    docs = load_documents(os.path.dirname(local_path))
+    docs = load_single_document(local_path)
 
     if not docs:
         print(f"⚠️  No se pudieron cargar documentos desde {local_path}")
@@ -67,6 +208,14 @@ def _process_document(local_path: str):
     print(f"Dividiendo en chunks...")
     chunks = split_documents(docs)
 
+    # Guardamos clave S3 y hash en la metadata de cada chunk: es lo que
+    # permite a _already_indexed saltarse ficheros sin cambios.
+    chunk_lists = chunks if isinstance(chunks, tuple) else (chunks,)
+    for chunk_list in chunk_lists:
+        for chunk in chunk_list:
+            chunk.metadata["s3_key"] = key
+            chunk.metadata["file_hash"] = file_hash
+
     print(f"Indexando en pgvector...")
     build_vectorstore(chunks)
 
@@ -24,11 +24,23 @@ CREATE TABLE IF NOT EXISTS langchain_pg_embedding (
     uuid            UUID        PRIMARY KEY
 );
 
--- Índice de búsqueda vectorial por similitud coseno (ivfflat = ANN aproximado, rápido)
-CREATE INDEX IF NOT EXISTS langchain_pg_embedding_vector_idx
-ON langchain_pg_embedding USING ivfflat (embedding vector_cosine_ops)
-WITH (lists = 100);
+-- Índice de búsqueda vectorial por similitud coseno.
+-- HNSW en lugar de ivfflat: mejor recall/latencia y, a diferencia de ivfflat,
+-- no necesita "entrenar" las listas sobre datos ya cargados — funciona bien
+-- aunque se cree sobre la tabla vacía (nuestro caso, pre-creamos el schema).
+-- Requiere pgvector >= 0.5 (disponible en RDS/Aurora actuales).
+DROP INDEX IF EXISTS langchain_pg_embedding_vector_idx;
+CREATE INDEX IF NOT EXISTS langchain_pg_embedding_hnsw_idx
+ON langchain_pg_embedding USING hnsw (embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
 
 -- Índice por collection_id para filtrar por colección rápidamente
 CREATE INDEX IF NOT EXISTS langchain_pg_embedding_collection_idx
 ON langchain_pg_embedding (collection_id);
+
+-- Índice de expresión para las consultas del processor por metadata JSON:
+-- la comprobación de hash (skip de ficheros sin cambios) y la limpieza de
+-- chunks obsoletos filtran por cmetadata->>'s3_key'; sin este índice cada
+-- invocación de la Lambda hace un seq scan de toda la tabla de embeddings.
+CREATE INDEX IF NOT EXISTS langchain_pg_embedding_s3_key_idx
+ON langchain_pg_embedding ((cmetadata->>'s3_key'));